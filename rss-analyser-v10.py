@@ -1,14 +1,23 @@
 # rss-analyser-v10.py
 import psycopg2
-from psycopg2.extras import execute_batch
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extras import Json, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import hashlib
 import json
+import orjson
+import random
 import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from tqdm import tqdm
 from dotenv import load_dotenv
 import os
 import logging
-from pydantic import BaseModel, ValidationError, Field
+import weakref
+from pydantic import BaseModel, TypeAdapter, ValidationError, Field, field_validator
 from typing import Any, List, Literal, Optional, Set
 
 try:
@@ -21,6 +30,8 @@ try:
 except ImportError:
     OpenAI = None
 
+__version__ = "10.0"
+
 
 # Load environment variables from .env file
 load_dotenv()
@@ -49,16 +60,47 @@ logger = logging.getLogger(__name__)
 
 # Database setup
 DATABASE_URL = os.getenv('DATABASE_URL')
+STATEMENT_TIMEOUT_MS = 60000
 connection_pool = None
+configured_connections = weakref.WeakSet()
 
 def init_connection_pool():
     global connection_pool
-    connection_pool = SimpleConnectionPool(
-        minconn=1,
-        maxconn=5,
+    # One connection per claimed batch (in flight plus one prefetched) and one for setup queries.
+    # ThreadedConnectionPool keeps getconn/putconn safe alongside the worker threads.
+    connection_pool = ThreadedConnectionPool(
+        minconn=2,
+        maxconn=MAX_CONCURRENT_REQUESTS + 2,
         dsn=DATABASE_URL
     )
 
+def get_connection() -> psycopg2.extensions.connection:
+    """Check a connection out of the pool, applying session settings on its first checkout."""
+    conn = connection_pool.getconn()
+    if conn not in configured_connections:
+        with conn.cursor() as cursor:
+            cursor.execute("SET statement_timeout = %s;", (STATEMENT_TIMEOUT_MS,))
+        conn.commit()
+        configured_connections.add(conn)
+    return conn
+
+def release_connection(conn: psycopg2.extensions.connection) -> None:
+    """Roll back anything left open on the connection and return it to the pool."""
+    try:
+        conn.rollback()
+    except psycopg2.Error as rb_err:
+        logger.error(f"Rollback failed: {rb_err}")
+    connection_pool.putconn(conn)
+
+@contextmanager
+def pooled_connection():
+    """Borrow a configured connection for the duration of a with-block."""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
 # AI Provider configuration
 if AI_PROVIDER == 'gemini':
     if genai is None:
@@ -74,13 +116,19 @@ elif AI_PROVIDER == 'openrouter':
     )
     MODEL_NAME = os.getenv('OPENROUTER_MODEL', 'deepseek/deepseek-v4-flash')
 
-logger.info(f"Using AI provider: {AI_PROVIDER}, model: {MODEL_NAME}")
+logger.info(f"RSS analyser v{__version__} using AI provider: {AI_PROVIDER}, model: {MODEL_NAME}")
 
-BATCH_SIZE = 10
+# Larger batches amortise the fixed per-request overhead (static prompt prefill,
+# HTTPS round-trip, DB fetch); tune with the token usage logged per batch.
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', 50))
+OUTPUT_TOKENS_PER_ENTRY = 2000
+MAX_OUTPUT_TOKENS = int(os.getenv('MAX_OUTPUT_TOKENS', min(OUTPUT_TOKENS_PER_ENTRY * BATCH_SIZE, 65536)))
 # Provider-specific rate limiting: OpenRouter doesn't need Gemini's rate limits
 DEFAULT_RATE_LIMIT = 0 if AI_PROVIDER == 'openrouter' else 4
 SECONDS_PER_REQUEST = float(os.getenv('RATE_LIMIT_SECONDS', DEFAULT_RATE_LIMIT))
+MAX_CONCURRENT_REQUESTS = max(1, int(os.getenv('MAX_CONCURRENT_REQUESTS', 3)))
 MAX_RUNTIME_SECONDS = 3600 # 1 hour timeout
+SAVEPOINT_CHUNK_SIZE = 10 # rows retried together when a batch insert fails
 PROMPT_FILE = os.getenv('PROMPT_FILE', 'prompt-google.txt')
 
 VALID_SENTIMENTS = {"positive", "neutral", "negative"}
@@ -122,12 +170,29 @@ CategoryValue = Literal[
 
 
 
-class ArticleResponse(BaseModel):
-    translated_title: str = Field(default="")
-    translated_description: str = Field(default="")
-    keywords: List[str] = Field(default_factory=list)
-    sentiment: SentimentValue
-    category: CategoryValue
+class RequestThrottle:
+    """Thread-safe limiter that spaces request start times `interval` seconds apart."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def back_off(self, delay: float) -> None:
+        """Hold back every later request start until at least `delay` seconds from now."""
+        with self._lock:
+            self._next_start = max(self._next_start, time.monotonic() + delay)
+
+
+request_throttle = RequestThrottle(SECONDS_PER_REQUEST)
 
 
 def normalize_sentiment(value: Any) -> str:
@@ -160,103 +225,302 @@ def normalize_keywords(value: Any) -> list[str]:
     return keywords
 
 
+class ArticleResponse(BaseModel):
+    translated_title: str = Field(default="")
+    translated_description: str = Field(default="")
+    keywords: List[str] = Field(default_factory=list)
+    sentiment: SentimentValue
+    category: CategoryValue
+
+    @field_validator("sentiment", mode="before")
+    @classmethod
+    def _normalize_sentiment(cls, value: Any) -> str:
+        return normalize_sentiment(value)
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _normalize_category(cls, value: Any) -> str:
+        return normalize_category(value)
+
+    @field_validator("keywords", mode="before")
+    @classmethod
+    def _normalize_keywords(cls, value: Any) -> list[str]:
+        return normalize_keywords(value)
+
+
+# Validates a whole response array in a single call
+ARTICLE_LIST_ADAPTER = TypeAdapter(List[ArticleResponse])
+
+
+# Built once and shared by every batch. The response schema makes Gemini return
+# a bare JSON array of ArticleResponse objects, so no markdown fences to strip.
+GEMINI_GENERATION_CONFIG = None
+if AI_PROVIDER == 'gemini':
+    GEMINI_GENERATION_CONFIG = genai.types.GenerateContentConfig(
+        temperature=0.7,
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        response_mime_type="application/json",
+        response_schema=list[ArticleResponse],
+    )
+
+
 def normalize_article_response(raw_item: Any) -> ArticleResponse:
-    if not isinstance(raw_item, dict):
-        raise ValueError("Article response item must be an object")
+    return ArticleResponse.model_validate(raw_item)
+
+
+def json_dumps(value: Any) -> str:
+    """Serialize to a JSON string with orjson, for text parameters and psycopg2's Json adapter."""
+    return orjson.dumps(value).decode("utf-8")
+
+
+def analysis_cache_key(title: Any, description: Any) -> str:
+    """Hash an entry's source text so republished stories share one cached analysis."""
+    title = "" if title is None else str(title)
+    description = "" if description is None else str(description)
+    return hashlib.sha256(f"{title}\x1f{description}".encode("utf-8")).hexdigest()
+
+
+def analysis_row_to_result(row: tuple) -> dict:
+    """Convert an analysis row into the JSON document stored in analysis_cache."""
+    _, translated_title, translated_description, keywords, sentiment, category = row
+    return {
+        "translated_title": translated_title,
+        "translated_description": translated_description,
+        "keywords": keywords,
+        "sentiment": sentiment,
+        "category": category,
+    }
+
+
+def analysis_result_to_row(entry_id: int, result: dict) -> tuple:
+    """Build an rss_feed_analysed row for an entry from a cached analysis."""
+    return (
+        entry_id,
+        result["translated_title"],
+        result["translated_description"],
+        result["keywords"],
+        result["sentiment"],
+        result["category"],
+    )
 
-    normalized = dict(raw_item)
-    normalized["sentiment"] = normalize_sentiment(normalized.get("sentiment"))
-    normalized["category"] = normalize_category(normalized.get("category"))
-    normalized["keywords"] = normalize_keywords(normalized.get("keywords", []))
-    return ArticleResponse(**normalized)
+
+@lru_cache(maxsize=1)
+def load_prompt_template() -> str:
+    """Read the prompt template once; later batches reuse the cached text."""
+    with open(PROMPT_FILE, 'r') as f:
+        return f.read()
 
 
 def fetch_unprocessed_entries(
     conn: psycopg2.extensions.connection,
     batch_size: int,
-    excluded_ids: Optional[Set[int]] = None,
+    after_id: int = 0,
 ) -> list[tuple]:
-    """Fetch a batch of unprocessed RSS feed entries.
-    
+    """Fetch and lock the next batch of unprocessed RSS feed entries.
+
+    Batches are read in id order starting after `after_id`, so a run walks the
+    backlog in a single pass and never rescans rows it already handled. The rows
+    stay locked until the connection's transaction ends, and rows locked by other
+    workers are skipped, so concurrent analysers never share a batch.
+
     Args:
         conn: Database connection
         batch_size: Maximum number of entries to fetch
-        
+        after_id: Only entries with a larger id are returned
+
     Returns:
         List of tuples containing (id, title, description) for each entry
     """
-    excluded_ids = excluded_ids or set()
-    params: list[Any] = []
-    exclusion_clause = ""
-    if excluded_ids:
-        exclusion_clause = "AND NOT (id = ANY(%s))"
-        params.append(list(excluded_ids))
-
-    params.append(batch_size)
-
     with conn.cursor() as cursor:
-        cursor.execute(f"""
-            SET LOCAL statement_timeout = 60000;
-
+        cursor.execute("""
             SELECT id, title, description
             FROM rss_feed_entries
             WHERE processed = FALSE
-            {exclusion_clause}
+            AND id > %s
             ORDER BY id ASC
-            LIMIT %s;
-        """, params)
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED;
+        """, (after_id, batch_size))
         return cursor.fetchall()
 
 
-def mark_as_processed(conn: psycopg2.extensions.connection, success_ids: list[int]) -> None:
-    """Mark successfully analysed entries in the database by setting processed = TRUE.
+def store_analysed_entries(conn: psycopg2.extensions.connection, analysed_data: list[tuple]) -> None:
+    """Insert analysed data and mark the matching entries as processed in one statement.
+
+    The INSERT runs inside a writable CTE whose RETURNING ids drive the UPDATE,
+    so only entries that were actually stored get processed = TRUE.
 
     Args:
         conn: Database connection
-        success_ids: List of entry IDs that were successfully analyzed
+        analysed_data: List of tuples containing analysis results
     """
-    if not success_ids:
+    if not analysed_data:
         return
 
+    # Keywords travel as a Python list and are adapted straight to the JSON column
+    rows = [
+        (entry_id, translated_title, translated_description, Json(keywords, dumps=json_dumps), sentiment, category)
+        for entry_id, translated_title, translated_description, keywords, sentiment, category in analysed_data
+    ]
+
     with conn.cursor() as cursor:
-        cursor.execute("SET LOCAL statement_timeout = 60000;")
-        execute_batch(cursor, """
+        execute_values(cursor, """
+            WITH inserted AS (
+                INSERT INTO rss_feed_analysed
+                (entry_id, translated_title, translated_description, keywords, sentiment, category)
+                VALUES %s
+                RETURNING entry_id
+            )
             UPDATE rss_feed_entries
             SET processed = TRUE
-            WHERE id = %s;
-        """, [(id_,) for id_ in success_ids])
+            WHERE id IN (SELECT entry_id FROM inserted);
+        """, rows, template="(%s, %s, %s, %s, %s, %s)", page_size=BATCH_SIZE)
+
+def ensure_analysis_cache_table(conn: psycopg2.extensions.connection) -> None:
+    """Create the analysis_cache table used to skip re-analysing identical stories."""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                hash TEXT PRIMARY KEY,
+                result JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+    conn.commit()
+
+def lookup_cached_analyses(
+    conn: psycopg2.extensions.connection,
+    entries: list[tuple],
+) -> tuple[list[tuple], list[tuple]]:
+    """Answer what we can of a batch from analysis_cache.
 
-def insert_analysed_entries(conn: psycopg2.extensions.connection, analysed_data: list[tuple]) -> None:
-    """Insert analysed data into the rss_feed_analysed table.
-    
     Args:
         conn: Database connection
+        entries: List of (id, title, description) tuples
+
+    Returns:
+        Tuple of (analysis rows built from cache hits, entries that still need the AI provider)
+    """
+    keys = {entry[0]: analysis_cache_key(entry[1], entry[2]) for entry in entries}
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT hash, result FROM analysis_cache WHERE hash = ANY(%s);",
+            (list(set(keys.values())),),
+        )
+        cached = dict(cursor.fetchall())
+
+    cached_rows = []
+    misses = []
+    for entry in entries:
+        result = cached.get(keys[entry[0]])
+        if result is None:
+            misses.append(entry)
+        else:
+            cached_rows.append(analysis_result_to_row(entry[0], result))
+    return cached_rows, misses
+
+def cache_analyses(
+    conn: psycopg2.extensions.connection,
+    entries: list[tuple],
+    analysed_data: list[tuple],
+) -> None:
+    """Record analysis results in analysis_cache, keeping existing entries.
+
+    Args:
+        conn: Database connection
+        entries: The (id, title, description) tuples the rows were produced for
         analysed_data: List of tuples containing analysis results
     """
+    if not analysed_data:
+        return
+
+    keys = {entry[0]: analysis_cache_key(entry[1], entry[2]) for entry in entries}
+    cache_rows = {keys[row[0]]: Json(analysis_row_to_result(row), dumps=json_dumps) for row in analysed_data}
+
     with conn.cursor() as cursor:
-        cursor.execute("SET LOCAL statement_timeout = 60000;")
-        execute_batch(cursor, """
-            INSERT INTO rss_feed_analysed
-            (entry_id, translated_title, translated_description, keywords, sentiment, category)
-            VALUES (%s, %s, %s, %s, %s, %s);
-        """, analysed_data)
+        execute_values(cursor, """
+            INSERT INTO analysis_cache (hash, result)
+            VALUES %s
+            ON CONFLICT (hash) DO NOTHING;
+        """, list(cache_rows.items()), page_size=BATCH_SIZE)
 
 def count_unprocessed_entries(conn: psycopg2.extensions.connection) -> int:
-    """Count total unprocessed entries for progress bar.
-    
+    """Estimate the number of unprocessed entries for the progress bar.
+
+    Uses the planner's row estimate instead of COUNT(*), so it costs no scan;
+    the progress bar only needs a ballpark figure.
+
     Args:
         conn: Database connection
-        
+
     Returns:
-        Number of unprocessed entries
+        Estimated number of unprocessed entries
     """
     with conn.cursor() as cursor:
         cursor.execute("""
-            SET LOCAL statement_timeout = 60000;
-            SELECT COUNT(*) FROM rss_feed_entries WHERE processed = FALSE
+            EXPLAIN (FORMAT JSON)
+            SELECT 1 FROM rss_feed_entries WHERE processed = FALSE
         """)
-        count = cursor.fetchone()[0]
-    return count
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+def parse_response_items(text: str) -> list:
+    """Parse the model's JSON array, keeping the complete items of a cut-off response.
+
+    A response that hit the output token limit fails a full parse; decoding the
+    array item by item still recovers every object that was fully generated, so
+    those entries are stored instead of being sent to the API again.
+
+    Raises:
+        ValueError: If the text is not a JSON array and no complete item can be recovered
+    """
+    try:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        start = text.find("[")
+        if start == -1:
+            raise
+
+        decoder = json.JSONDecoder()
+        items = []
+        pos = start + 1
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(text) or text[pos] == "]":
+                break
+            try:
+                item, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            items.append(item)
+
+        if not items:
+            raise
+        logger.warning("Response JSON was incomplete; recovered %s complete items", len(items))
+        return items
+
+    if not isinstance(data, list):
+        raise ValueError("Top-level JSON must be an array")
+    return data
+
+def rate_limit_delay(error: Exception) -> Optional[float]:
+    """Return the back-off for a provider rate-limit (HTTP 429) error, or None for other errors.
+
+    Honours the Retry-After header when the provider sends one, otherwise returns 0.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status != 429:
+        return None
+
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return 0.0
 
 def process_batch(entries: list[tuple]) -> list[tuple]:
     """Process a batch of RSS feed entries using Google's Gemini API, with Pydantic validation."""
@@ -267,22 +531,19 @@ def process_batch(entries: list[tuple]) -> list[tuple]:
         logger.warning("No entries to process in batch.")
         return results
 
-    # Load prompt template
     try:
-        with open(PROMPT_FILE, 'r') as f:
-            prompt_template = f.read()
+        prompt_template = load_prompt_template()
     except FileNotFoundError:
         logger.error("Prompt file not found: %s", PROMPT_FILE)
         return results
 
-    batch_input = ""
-    entry_map = {}
-    for idx, entry in enumerate(entries):
-        entry_id, title, description = entry
+    parts = []
+    for idx, (_, title, description) in enumerate(entries):
         title = str(title) if title is not None else "Untitled"
         description = str(description) if description is not None else "No description"
-        batch_input += f"Entry {idx + 1}:\n- Title: {title}\n- Description: {description}\n\n"
-        entry_map[idx + 1] = entry_id
+        parts.append(f"Entry {idx + 1}:\n- Title: {title}\n- Description: {description}\n\n")
+    batch_input = "".join(parts)
+    entry_map = {idx + 1: entry[0] for idx, entry in enumerate(entries)}
 
     if not batch_input.strip():
         logger.error("Batch input is empty after construction")
@@ -294,7 +555,7 @@ def process_batch(entries: list[tuple]) -> list[tuple]:
             logger.error("Formatted prompt is empty")
             return results
 
-        max_retries = 3
+        max_retries = 5
         retry_delay = 1
 
         for attempt in range(max_retries):
@@ -303,41 +564,63 @@ def process_batch(entries: list[tuple]) -> list[tuple]:
                     response = gemini_client.models.generate_content(
                         model=MODEL_NAME,
                         contents=prompt,
-                        config=genai.types.GenerateContentConfig(
-                            temperature=0.7,
-                            max_output_tokens=2000 * BATCH_SIZE,
-                        )
+                        config=GEMINI_GENERATION_CONFIG,
                     )
                     raw_response = response.text
+                    usage = response.usage_metadata
+                    if usage:
+                        logger.debug(
+                            "Token usage for %s entries: prompt=%s, output=%s",
+                            len(entries),
+                            usage.prompt_token_count,
+                            usage.candidates_token_count,
+                        )
                 elif AI_PROVIDER == 'openrouter':
                     response = openrouter_client.chat.completions.create(
                         model=MODEL_NAME,
                         messages=[{"role": "user", "content": prompt}],
                         temperature=0.7,
-                        max_tokens=2000 * BATCH_SIZE,
+                        max_tokens=MAX_OUTPUT_TOKENS,
                     )
                     raw_response = response.choices[0].message.content
+                    usage = response.usage
+                    if usage:
+                        logger.debug(
+                            "Token usage for %s entries: prompt=%s, output=%s",
+                            len(entries),
+                            usage.prompt_tokens,
+                            usage.completion_tokens,
+                        )
                 break
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
-                logger.warning(f"API call failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                time.sleep(retry_delay)
-                retry_delay *= 2
+                backoff = retry_delay + random.uniform(0, retry_delay)
+                retry_delay = min(retry_delay * 2, 30)
+
+                rate_limit_wait = rate_limit_delay(e)
+                if rate_limit_wait is None:
+                    logger.warning(f"API call failed (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                    time.sleep(backoff)
+                else:
+                    # Rate limits are shared, so slow every worker down rather than only this retry
+                    logger.warning(f"API rate limit hit (attempt {attempt + 1}/{max_retries}): {str(e)}")
+                    request_throttle.back_off(max(backoff, rate_limit_wait))
+                    request_throttle.wait()
 
         cleaned_response = raw_response.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response.split("```json")[1]
-        if cleaned_response.endswith("```"):
-            cleaned_response = cleaned_response.split("```")[0]
-        cleaned_response = cleaned_response.strip()
+        if AI_PROVIDER == 'openrouter':
+            # OpenRouter models are not schema-constrained and may wrap the array in a code fence
+            if cleaned_response.startswith("```json"):
+                cleaned_response = cleaned_response.split("```json")[1]
+            if cleaned_response.endswith("```"):
+                cleaned_response = cleaned_response.split("```")[0]
+            cleaned_response = cleaned_response.strip()
 
         # --- Parse and Validate
         try:
-            data = json.loads(cleaned_response)
-            if not isinstance(data, list):
-                raise ValueError("Top-level JSON must be an array")
-        except (json.JSONDecodeError, ValueError) as e:
+            data = parse_response_items(cleaned_response)
+        except ValueError as e:
             logger.error(f"Invalid JSON response format: {e}")
             logger.debug(f"Response content: {cleaned_response}")
             return results
@@ -345,23 +628,33 @@ def process_batch(entries: list[tuple]) -> list[tuple]:
         if len(data) != len(entries):
             logger.warning(f"Expected {len(entries)} results, got {len(data)}")
 
-        for idx, raw_item in enumerate(data[:len(entries)]):
+        raw_items = data[:len(entries)]
+        try:
+            validated_items = ARTICLE_LIST_ADAPTER.validate_python(raw_items)
+        except ValidationError:
+            # Some items are invalid; validate one by one so only those entries are dropped
+            validated_items = None
+
+        for idx, raw_item in enumerate(raw_items):
             entry_id = entry_map.get(idx + 1)
             if not entry_id:
                 logger.warning(f"No mapping for index {idx + 1}")
                 continue
 
-            try:
-                validated_item = normalize_article_response(raw_item)
-            except (ValidationError, ValueError) as ve:
-                logger.warning(f"Validation error for entry ID {entry_id}: {ve}")
-                continue  # Skip invalid entry
+            if validated_items is not None:
+                validated_item = validated_items[idx]
+            else:
+                try:
+                    validated_item = normalize_article_response(raw_item)
+                except (ValidationError, ValueError) as ve:
+                    logger.warning(f"Validation error for entry ID {entry_id}: {ve}")
+                    continue  # Skip invalid entry
 
             results.append((
                 entry_id,
                 validated_item.translated_title,
                 validated_item.translated_description,
-                json.dumps(validated_item.keywords),
+                validated_item.keywords,
                 validated_item.sentiment,
                 validated_item.category
             ))
@@ -372,84 +665,199 @@ def process_batch(entries: list[tuple]) -> list[tuple]:
 
     return results
 
-def main():
-    start_time = time.time()
-    processed_count_in_run = 0
-    deferred_entry_ids = set()
-    conn = None
+def analyse_batch(entries: list[tuple]) -> list[tuple]:
+    """Wait for a rate-limit slot, then analyse the batch. Runs on worker threads."""
+    if not entries:
+        return []
+    request_throttle.wait()
+    return process_batch(entries)
 
-    try:
-        conn = connection_pool.getconn()
+def store_with_savepoints(
+    conn: psycopg2.extensions.connection,
+    entries: list[tuple],
+    analysed_data: list[tuple],
+    cached_entry_ids: Set[int] = frozenset(),
+) -> list[tuple]:
+    """Store analysis rows so that a database error only loses the rows involved.
 
-        total_entries = count_unprocessed_entries(conn)
-        logger.info(f"Found {total_entries} unprocessed entries")
+    The whole batch is written under one savepoint first. If that fails, the rows
+    are retried in chunks of SAVEPOINT_CHUNK_SIZE, each under its own savepoint,
+    so a bad row rolls back only its chunk and the rest of the batch still commits.
 
-        with tqdm(total=total_entries, desc="Processing entries", unit="entry") as pbar:
-            last_request_time = 0
+    Args:
+        conn: Database connection
+        entries: The (id, title, description) tuples that were sent for analysis
+        analysed_data: Analysis rows produced for the batch
+        cached_entry_ids: IDs whose rows came from analysis_cache and are not written back to it
 
-            while True:
-                if time.time() - start_time > MAX_RUNTIME_SECONDS:
-                    logger.warning(f"Maximum runtime of {MAX_RUNTIME_SECONDS // 60} minutes exceeded. Exiting.")
-                    break
+    Returns:
+        The rows that were stored
+    """
+    if not analysed_data:
+        return []
 
-                entries = fetch_unprocessed_entries(conn, BATCH_SIZE, deferred_entry_ids)
-                if not entries:
-                    logger.info("No more entries to process")
-                    break
+    def provider_rows(rows: list[tuple]) -> list[tuple]:
+        return [row for row in rows if row[0] not in cached_entry_ids]
 
-                entry_ids = [entry[0] for entry in entries]
-                batch_size_fetched = len(entry_ids)
+    with conn.cursor() as cursor:
+        cursor.execute("SAVEPOINT store_batch;")
+        try:
+            store_analysed_entries(conn, analysed_data)
+            cache_analyses(conn, entries, provider_rows(analysed_data))
+        except psycopg2.Error as db_err:
+            cursor.execute("ROLLBACK TO SAVEPOINT store_batch;")
+            logger.warning(f"Database error storing batch: {db_err}. Retrying in chunks of {SAVEPOINT_CHUNK_SIZE}.")
+        else:
+            cursor.execute("RELEASE SAVEPOINT store_batch;")
+            return analysed_data
+
+        stored_rows = []
+        for start in range(0, len(analysed_data), SAVEPOINT_CHUNK_SIZE):
+            chunk = analysed_data[start:start + SAVEPOINT_CHUNK_SIZE]
+            cursor.execute("SAVEPOINT store_chunk;")
+            try:
+                store_analysed_entries(conn, chunk)
+                cache_analyses(conn, entries, provider_rows(chunk))
+            except psycopg2.Error as db_err:
+                cursor.execute("ROLLBACK TO SAVEPOINT store_chunk;")
+                logger.warning(f"Database error storing entries {[row[0] for row in chunk]}: {db_err}")
+            else:
+                cursor.execute("RELEASE SAVEPOINT store_chunk;")
+                stored_rows.extend(chunk)
+        return stored_rows
+
+def save_batch_results(
+    conn: psycopg2.extensions.connection,
+    entries: list[tuple],
+    analysed_data: list[tuple],
+    deferred_entry_ids: Set[int],
+    cached_entry_ids: Set[int] = frozenset(),
+) -> Optional[int]:
+    """Commit the analysis of one batch and defer the entries that failed.
 
-                current_time = time.time()
-                time_since_last = current_time - last_request_time
-                if time_since_last < SECONDS_PER_REQUEST:
-                    time.sleep(SECONDS_PER_REQUEST - time_since_last)
+    Args:
+        conn: Database connection
+        entries: The (id, title, description) tuples that were sent for analysis
+        analysed_data: Analysis rows produced for the batch
+        deferred_entry_ids: Set of entry IDs left unprocessed for a later run; updated in place
+        cached_entry_ids: IDs whose rows were served from analysis_cache
 
-                analysed_data = process_batch(entries)
-                last_request_time = time.time()
+    Returns:
+        Number of entries stored, or None if the batch was rolled back
+    """
+    entry_ids = [entry[0] for entry in entries]
 
-                try:
-                    success_ids = [d[0] for d in analysed_data]
-                    failed_ids = sorted(set(entry_ids) - set(success_ids))
+    try:
+        stored_rows = store_with_savepoints(conn, entries, analysed_data, cached_entry_ids)
+        conn.commit()
+
+        success_ids = [row[0] for row in stored_rows]
+        failed_ids = sorted(set(entry_ids) - set(success_ids))
+
+        if failed_ids:
+            deferred_entry_ids.update(failed_ids)
+            logger.warning(
+                "Deferred %s entries after failed or invalid analysis: %s",
+                len(failed_ids),
+                failed_ids,
+            )
+
+        if not success_ids:
+            logger.error(
+                "No valid analysis rows produced for batch %s; entries remain unprocessed for retry.",
+                entry_ids,
+            )
+
+        return len(success_ids)
+
+    except psycopg2.Error as db_err:
+        logger.error(f"Database error during commit for batch: {db_err}. Rolling back transaction and continuing.")
+        try:
+            conn.rollback()
+        except psycopg2.Error as rb_err:
+            logger.error(f"Rollback failed: {rb_err}")
+        deferred_entry_ids.update(entry_ids)
+    except Exception as e:
+        logger.error(f"Unexpected error during DB interaction: {e}. Rolling back and continuing.")
+        try:
+            conn.rollback()
+        except Exception as rb_err:
+            logger.error(f"Rollback failed: {rb_err}")
+        deferred_entry_ids.update(entry_ids)
 
-                    if analysed_data:
-                        insert_analysed_entries(conn, analysed_data)
+    return None
 
-                    mark_as_processed(conn, success_ids)
+def main():
+    start_time = time.time()
+    processed_count_in_run = 0
+    deferred_entry_ids = set()
+    last_claimed_id = 0
+    in_flight = deque()
 
-                    conn.commit()
+    try:
+        with pooled_connection() as conn:
+            ensure_analysis_cache_table(conn)
+            total_entries = count_unprocessed_entries(conn)
+        logger.info(f"Found about {total_entries} unprocessed entries")
+
+        # Up to MAX_CONCURRENT_REQUESTS batches are at the provider at once, with
+        # one more prefetched behind them. The throttle spaces request starts,
+        # so the rate limit bounds throughput instead of model latency. All DB
+        # work stays on this thread and overlaps with the in-flight calls.
+        # Entries whose text is already in analysis_cache never reach the provider.
+        # Each batch is claimed with FOR UPDATE SKIP LOCKED on its own connection
+        # and stays locked until its results commit, so several analyser
+        # processes can safely work through the same backlog.
+        with tqdm(total=total_entries, desc="Processing entries", unit="entry") as pbar, \
+                ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            exhausted = False
 
-                    if failed_ids:
-                        deferred_entry_ids.update(failed_ids)
-                        logger.warning(
-                            "Deferred %s entries after failed or invalid analysis: %s",
-                            len(failed_ids),
-                            failed_ids,
-                        )
+            while True:
+                while not exhausted and len(in_flight) <= MAX_CONCURRENT_REQUESTS:
+                    if time.time() - start_time > MAX_RUNTIME_SECONDS:
+                        logger.warning(f"Maximum runtime of {MAX_RUNTIME_SECONDS // 60} minutes exceeded. Exiting.")
+                        exhausted = True
+                        break
 
-                    if not success_ids:
-                        logger.error(
-                            "No valid analysis rows produced for batch %s; entries remain unprocessed for retry.",
-                            entry_ids,
-                        )
+                    batch_conn = get_connection()
+                    try:
+                        entries = fetch_unprocessed_entries(batch_conn, BATCH_SIZE, last_claimed_id)
+                        if entries:
+                            cached_rows, misses = lookup_cached_analyses(batch_conn, entries)
+                    except Exception:
+                        release_connection(batch_conn)
+                        raise
+
+                    if not entries:
+                        release_connection(batch_conn)
+                        logger.info("No more entries to process")
+                        exhausted = True
+                        break
+
+                    last_claimed_id = entries[-1][0]
+                    if cached_rows:
+                        logger.info("Reusing cached analysis for %s of %s entries", len(cached_rows), len(entries))
+
+                    in_flight.append((batch_conn, entries, cached_rows, executor.submit(analyse_batch, misses)))
+
+                if not in_flight:
+                    break
 
-                    pbar.update(batch_size_fetched)
-                    processed_count_in_run += len(success_ids)
+                batch_conn, entries, cached_rows, future = in_flight[0]
+                analysed_data = cached_rows + future.result()
+                in_flight.popleft()
+                # Cache hits are stored for the entries but not re-inserted into analysis_cache
+                cached_entry_ids = {row[0] for row in cached_rows}
+                try:
+                    stored_count = save_batch_results(
+                        batch_conn, entries, analysed_data, deferred_entry_ids, cached_entry_ids
+                    )
+                finally:
+                    release_connection(batch_conn)
 
-                except psycopg2.Error as db_err:
-                    logger.error(f"Database error during commit for batch: {db_err}. Rolling back transaction and continuing.")
-                    try:
-                        conn.rollback()
-                    except psycopg2.Error as rb_err:
-                        logger.error(f"Rollback failed: {rb_err}")
-                    deferred_entry_ids.update(entry_ids)
-                except Exception as e:
-                    logger.error(f"Unexpected error during DB interaction: {e}. Rolling back and continuing.")
-                    try:
-                        conn.rollback()
-                    except Exception as rb_err:
-                        logger.error(f"Rollback failed: {rb_err}")
-                    deferred_entry_ids.update(entry_ids)
+                if stored_count is not None:
+                    pbar.update(len(entries))
+                    processed_count_in_run += stored_count
 
         logger.info(
             "Processing finished. Total entries successfully analysed: %s. Deferred for future retry: %s",
@@ -459,25 +867,16 @@ def main():
 
     except psycopg2.Error as e:
         logger.error(f"Database connection error: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
         raise
 
     except Exception as e:
         logger.error(f"Unexpected error in main: {type(e).__name__}: {e}")
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
         raise
 
     finally:
-        if conn:
-            connection_pool.putconn(conn)
+        # Release claimed batches that never got stored so their rows unlock
+        for batch_conn, *_ in in_flight:
+            release_connection(batch_conn)
 
 if __name__ == "__main__":
     try:
@@ -1,13 +1,31 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
 import feedparser
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey, Boolean, text
+from sqlalchemy import create_engine, inspect, Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index, UniqueConstraint, text, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from datetime import datetime
-from bs4 import BeautifulSoup
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+import json
+from selectolax.lexbor import LexborHTMLParser
 import logging
 from dotenv import load_dotenv
 import os
 import sys
+import atexit
+import hashlib
+import threading
+from urllib.parse import urlsplit
+import io
+import xml.etree.ElementTree as ET
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from heapq import nlargest
+from operator import itemgetter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,12 +41,96 @@ logging.basicConfig(
 # Database setup
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+engine_options = {}
+if make_url(DATABASE_URL).get_backend_name() == 'postgresql':
+    # Feed ingestion is idempotent (a lost commit is re-fetched next run), so
+    # skipping the WAL flush wait on commit is a safe trade
+    engine_options['connect_args'] = {'options': '-c synchronous_commit=off'}
+
+# Writes happen on a single thread, so the default pool size is enough
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    isolation_level="AUTOCOMMIT",  # <- IMPORTANT
+    pool_recycle=1800,
+    **engine_options,
 )
 
+# Shared HTTP session: keep-alive connections are reused across feeds on the same host
+REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', 16))
+# Feeds fetched at once from any one host
+MAX_REQUESTS_PER_HOST = 4
+# Feeds written per transaction; each feed still gets its own savepoint
+FEEDS_PER_COMMIT = 10
+MAX_FEED_BYTES = int(os.getenv('MAX_FEED_BYTES', 10 * 1024 * 1024))
+FEED_CHUNK_BYTES = 64 * 1024
+# Items kept per feed before parsing; feeds list newest first, and only the
+# newest 20 are stored, so the rest of a long archive is dead weight
+MAX_FEED_ITEMS = 50
+FEED_ITEM_TAGS = ('item', 'entry')
+# Entries dated up to this long before a source's newest stored entry are
+# still checked, so items that appear late with an earlier date are kept
+BACKDATED_ENTRY_GRACE = timedelta(days=1)
+
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+)
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+SESSION.headers['User-Agent'] = 'rss-fetcher/1.0'
+# gzip and deflate always; br/zstd too when brotli/zstandard are installed for urllib3 to decode them
+SESSION.headers['Accept-Encoding'] = ACCEPT_ENCODING
+atexit.register(SESSION.close)
+
+def submit_per_host(executor, fn, calls):
+    """Submit fn(*args) for each args tuple, at most MAX_REQUESTS_PER_HOST per host at once.
+
+    The host is taken from each tuple's first element, a URL. Calls beyond a
+    host's limit wait in a per-host queue, not in the executor, so a busy host
+    never ties up pool threads that other hosts could use; each finished call
+    submits the next one for its host.
+
+    Returns one Future per call, in the order of calls.
+    """
+    results = [Future() for _ in calls]
+    queues = defaultdict(deque)
+    for index, args in enumerate(calls):
+        queues[urlsplit(args[0]).netloc.lower()].append(index)
+    lock = threading.Lock()
+
+    def start(host, index):
+        # Never called with the lock held: a call that is already done runs
+        # its callback, and so finish(), right here
+        executor.submit(fn, *calls[index]).add_done_callback(
+            lambda inner: finish(host, index, inner)
+        )
+
+    def finish(host, index, inner):
+        with lock:
+            next_index = queues[host].popleft() if queues[host] else None
+        if next_index is not None:
+            start(host, next_index)
+
+        error = inner.exception()
+        if error is not None:
+            results[index].set_exception(error)
+        else:
+            results[index].set_result(inner.result())
+
+    # Round-robin the first wave so every host gets a thread early
+    first_wave = []
+    with lock:
+        for _ in range(MAX_REQUESTS_PER_HOST):
+            for host, queue in queues.items():
+                if queue:
+                    first_wave.append((host, queue.popleft()))
+    for host, index in first_wave:
+        start(host, index)
+    return results
+
 Base = declarative_base()
 
 # Define the RSS feed source model
@@ -37,12 +139,23 @@ class RSSFeedSource(Base):
     
     id = Column(Integer, primary_key=True)
     url = Column(String, unique=True, nullable=False)
+    # HTTP validators from the last successful fetch, sent back as a conditional GET
+    etag = Column(String)
+    last_modified = Column(String)
+    # Hash of the last body parsed, for servers that send no validators
+    content_hash = Column(String(16))
 
     entries = relationship("RSSFeedEntry", back_populates="feed")
 
 # Define the RSS feed entry model
 class RSSFeedEntry(Base):
     __tablename__ = 'rss_feed_entries'
+    # A link may be stored again when its feed republishes it with a newer date,
+    # so uniqueness is per (link, published) rather than per link.
+    __table_args__ = (
+        UniqueConstraint('link', 'published', name='uq_rss_feed_entries_link_published'),
+        Index('ix_rss_feed_entries_feed_id_published', 'feed_id', 'published'),
+    )
     
     id = Column(Integer, primary_key=True)
     title = Column(String)
@@ -54,16 +167,77 @@ class RSSFeedEntry(Base):
 
     feed = relationship("RSSFeedSource", back_populates="entries")
 
-# Create the tables
-Base.metadata.create_all(engine)
+# Schema setup is DDL round-trips on every start; set INIT_SCHEMA=false on
+# databases that are already up to date to skip it
+INIT_SCHEMA = os.getenv('INIT_SCHEMA', 'true').lower() not in ('0', 'false', 'no')
 
 def ensure_schema():
     """Keep fresh databases aligned with the analyzer's expected contract."""
+    if not INIT_SCHEMA:
+        return
+
+    # Create the tables
+    Base.metadata.create_all(engine)
+
     with engine.begin() as connection:
         connection.execute(text("""
             ALTER TABLE rss_feed_entries
             ADD COLUMN IF NOT EXISTS processed BOOLEAN NOT NULL DEFAULT FALSE;
         """))
+        connection.execute(text("""
+            ALTER TABLE rss_feed_sources
+            ADD COLUMN IF NOT EXISTS etag VARCHAR,
+            ADD COLUMN IF NOT EXISTS last_modified VARCHAR,
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(16);
+        """))
+        # Backs the per-source "newest stored entry" lookup in add_new_entries
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_rss_feed_entries_feed_id_published
+            ON rss_feed_entries (feed_id, published);
+        """))
+        # Partial index backing the analyser's "WHERE processed = FALSE ORDER BY id" scans
+        connection.execute(text("""
+            CREATE INDEX IF NOT EXISTS rss_feed_entries_unprocessed_idx
+            ON rss_feed_entries (id)
+            WHERE processed = FALSE;
+        """))
+
+    # Backs the duplicate lookup and the ON CONFLICT insert. Kept in its own
+    # transaction: existing duplicate rows make it fail, which should not
+    # block fetching (see has_link_published_unique_index).
+    try:
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_rss_feed_entries_link_published
+                ON rss_feed_entries (link, published);
+            """))
+    except DBAPIError as e:
+        logging.warning(
+            f"Could not create unique index on rss_feed_entries (link, published); "
+            f"remove duplicate (link, published) rows to enable it: {e}"
+        )
+        # Without the unique index nothing else leads with link, so keep a plain
+        # one for the grouped link lookup in add_new_entries
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_rss_feed_entries_link
+                ON rss_feed_entries (link);
+            """))
+
+def has_link_published_unique_index():
+    """Check whether rss_feed_entries has a unique index on (link, published).
+
+    ON CONFLICT (link, published) is rejected by PostgreSQL without one, which
+    happens when duplicates blocked the index or INIT_SCHEMA=false skipped it.
+    """
+    inspector = inspect(engine)
+    columns = ['link', 'published']
+    if any(c['column_names'] == columns for c in inspector.get_unique_constraints('rss_feed_entries')):
+        return True
+    return any(
+        index.get('unique') and index['column_names'] == columns
+        for index in inspector.get_indexes('rss_feed_entries')
+    )
 
 def parse_entry_datetime(entry):
     parsed = entry.get('published_parsed') or entry.get('updated_parsed')
@@ -76,7 +250,7 @@ def parse_entry_datetime(entry):
         return None
 
 def prepare_feed_entry(entry):
-    link = str(entry.get('link', '')).strip()
+    link = str(entry.get('link') or '').strip()
     if not link:
         logging.warning("Skipping RSS entry without a link: %s", entry.get('title', '<untitled>'))
         return None
@@ -88,66 +262,380 @@ def prepare_feed_entry(entry):
 
     return entry, published_at, link
 
+def clean_description(raw):
+    """Strip markup and decode entities from a feed description."""
+    if not raw:
+        return ''
+    # Plain-text descriptions are common; skip building a parse tree for them
+    if '<' not in raw and '&' not in raw:
+        return raw
+
+    tree = LexborHTMLParser(raw)
+    tree.strip_tags(['script', 'style'])
+    return tree.text()
+
 # Function to add new entries
-def add_new_entries(session, feed_entries, source_id, limit=15):
+def add_new_entries(session, feed_entries, source_id, limit=15, conflict_columns=None):
     valid_entries = []
     for entry in feed_entries:
         prepared = prepare_feed_entry(entry)
         if prepared is not None:
             valid_entries.append(prepared)
 
-    latest_entries = sorted(valid_entries, key=lambda e: e[1], reverse=True)[:limit]
-    
+    # Entries well before the newest one already stored for this source were
+    # seen on an earlier run; on a quiet feed this empties the list and skips
+    # the link lookup entirely
+    newest_stored = (
+        session.query(func.max(RSSFeedEntry.published))
+        .filter(RSSFeedEntry.feed_id == source_id)
+        .scalar()
+    )
+    if newest_stored is not None:
+        # Capped at now: one future-dated entry (a mislabelled timezone or a
+        # scheduled post) must not block everything up to its date
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = min(newest_stored, now) - BACKDATED_ENTRY_GRACE
+        valid_entries = [prepared for prepared in valid_entries if prepared[1] > cutoff]
+
+    # prepare_feed_entry parses each date once; select the newest without a full sort
+    latest_entries = nlargest(limit, valid_entries, key=itemgetter(1))
+    if not latest_entries:
+        return 0
+
+    # One query for the newest stored version of every link in this feed
+    links = [link for _, _, link in latest_entries]
+    latest_published = dict(
+        session.query(RSSFeedEntry.link, func.max(RSSFeedEntry.published))
+        .filter(RSSFeedEntry.link.in_(links))
+        .group_by(RSSFeedEntry.link)
+        .all()
+    )
+
+    new_rows = []
     for entry, published_at, link in latest_entries:
-        latest_entry = session.query(RSSFeedEntry).filter_by(link=link).order_by(RSSFeedEntry.published.desc()).first()
-        
-        if latest_entry is None or published_at > latest_entry.published:
-            clean_description = BeautifulSoup(entry.get('description', ''), 'html.parser').get_text()
-            
-            rss_entry = RSSFeedEntry(
-                title=entry.get('title') or link,
-                link=link,
-                published=published_at,
-                description=clean_description,
-                feed_id=source_id,
-                processed=False
-            )
-            session.add(rss_entry)
-            print(f"Added new entry: {rss_entry.title}")
+        latest_published_at = latest_published.get(link)
+
+        if latest_published_at is None or published_at > latest_published_at:
+            new_rows.append({
+                'title': entry.get('title') or link,
+                'link': link,
+                'published': published_at,
+                'description': clean_description(entry.get('description')),
+                'feed_id': source_id,
+                'processed': False,
+            })
+            latest_published[link] = published_at
+
+    if not new_rows:
+        return 0
+
+    # All new rows for the feed go out as a single multi-row INSERT
+    # Without a conflict target the clause still guards any unique index present
+    result = session.execute(pg_insert(RSSFeedEntry).values(new_rows).on_conflict_do_nothing(
+        index_elements=conflict_columns
+    ))
+    # Rows skipped by ON CONFLICT, e.g. stored by a concurrent run, are not counted
+    return result.rowcount
+
+def read_feed_body(response, url):
+    """Read a streamed response body, stopping at MAX_FEED_BYTES."""
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=FEED_CHUNK_BYTES):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_FEED_BYTES:
+            logging.warning(f"Feed {url} exceeds {MAX_FEED_BYTES} bytes; parsing the first part only.")
+            break
+    return b''.join(chunks)[:MAX_FEED_BYTES]
+
+def trim_feed_items(content, max_items=MAX_FEED_ITEMS):
+    """Drop feed items past max_items before the document reaches feedparser.
+
+    Returns the content unchanged when the feed is short enough or is not
+    well-formed XML; feedparser's lenient parsing handles the latter.
+    """
+    stack = []
+    count = 0
+    try:
+        for event, element in ET.iterparse(io.BytesIO(content), events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                continue
+
+            stack.pop()
+            if element.tag.rsplit('}', 1)[-1] in FEED_ITEM_TAGS:
+                count += 1
+                if count > max_items:
+                    # iterparse builds ahead of the events it yields, so later
+                    # siblings may already be attached; cut them all off
+                    parent = stack[-1]
+                    del parent[list(parent).index(element):]
+                    return ET.tostring(stack[0], encoding='utf-8')
+    except ET.ParseError:
+        return content
+    return content
+
+def sniff_feed_format(content):
+    """Guess 'json', 'rss' or 'atom' from the start of a feed body."""
+    head = content[:512].lstrip(b'\xef\xbb\xbf \t\r\n')
+    if head.startswith(b'{'):
+        return 'json'
+    if b'<rss' in head:
+        return 'rss'
+    if b'<feed' in head:
+        return 'atom'
+    return None
+
+def parse_feed_date(value, rfc822=False):
+    """Parse a feed date to a UTC struct_time, raising ValueError if unparseable."""
+    value = value.strip()
+    if rfc822:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, IndexError):
+            parsed = None
+        if parsed is None:
+            raise ValueError(f"Unrecognised RFC 822 date: {value}")
+    else:
+        if value.endswith(('Z', 'z')):
+            value = value[:-1] + '+00:00'
+        parsed = datetime.fromisoformat(value)
+
+    # Naive dates are taken as UTC, matching feedparser
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.utctimetuple()
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+
+def _index_children(element):
+    """Map each child's tag to its first non-empty text, in one pass over the item.
+
+    Tags keep their namespace, so extension elements such as <media:title> or
+    <itunes:summary> never stand in for the core ones.
+
+    Returns:
+        Tuple of (fields, atom_link, permalink): the tag-to-text map, the Atom
+        alternate link href and the RSS permalink guid, each None if absent
+    """
+    fields = {}
+    atom_link = None
+    permalink = None
+    for child in element:
+        tag = child.tag
+        if tag == ATOM_NS + 'link' and atom_link is None and child.get('rel', 'alternate') == 'alternate':
+            atom_link = child.get('href')
+        text = ''.join(child.itertext()).strip()
+        if not text:
+            # Empty siblings such as <atom:link/> or <media:content/> must
+            # not shadow a later element with the same tag
+            continue
+        if tag not in fields:
+            fields[tag] = text
+        # RSS permalink guids stand in for a missing <link>, as in feedparser
+        if (tag == 'guid' and permalink is None
+                and child.get('isPermaLink', 'true').lower() != 'false'):
+            permalink = text
+    return fields, atom_link, permalink
+
+def parse_json_feed(content):
+    items = json.loads(content).get('items') or []
+    entries = []
+    for item in items[:MAX_FEED_ITEMS]:
+        date = item.get('date_published') or item.get('date_modified')
+        entry = {
+            'title': item.get('title'),
+            'published_parsed': parse_feed_date(date) if date else None,
+            'description': item.get('summary') or item.get('content_html') or item.get('content_text') or '',
+        }
+        link = item.get('url') or item.get('external_url')
+        if link:
+            entry['link'] = link
+        entries.append(entry)
+    return entries
+
+def parse_xml_feed(content, feed_format):
+    root = ET.fromstring(content)
+    # Only plain RSS 2.0 and Atom 1.0 are read here; anything else, such as
+    # Atom 0.3, goes to feedparser
+    if feed_format == 'rss':
+        if root.tag != 'rss':
+            raise ValueError(f"Unexpected RSS root element: {root.tag}")
+        item_tag, ns = 'item', ''
+    else:
+        if root.tag != ATOM_NS + 'feed':
+            raise ValueError(f"Unexpected Atom root element: {root.tag}")
+        item_tag, ns = ATOM_NS + 'entry', ATOM_NS
+
+    entries = []
+    for element in root.iter(item_tag):
+        fields, atom_link, permalink = _index_children(element)
+        if feed_format == 'rss':
+            link = fields.get('link') or permalink
+            pub_date = fields.get('pubDate')
+            if pub_date:
+                published = parse_feed_date(pub_date, rfc822=True)
+            else:
+                dc_date = fields.get(DC_NS + 'date')
+                published = parse_feed_date(dc_date) if dc_date else None
+            description = fields.get('description')
+        else:
+            link = atom_link
+            date = fields.get(ATOM_NS + 'published') or fields.get(ATOM_NS + 'updated')
+            published = parse_feed_date(date) if date else None
+            description = fields.get(ATOM_NS + 'summary') or fields.get(ATOM_NS + 'content')
+
+        entry = {
+            'title': fields.get(ns + 'title'),
+            'published_parsed': published,
+            'description': description or '',
+        }
+        # Left out rather than None, matching feedparser's entries
+        if link:
+            entry['link'] = link
+        entries.append(entry)
+        if len(entries) >= MAX_FEED_ITEMS:
+            break
+    return entries
+
+def parse_feed(content):
+    """Parse a feed body into a list of entry mappings.
+
+    Plain RSS 2.0, Atom and JSON Feed documents are read directly, which is
+    much cheaper than feedparser's format auto-detection. Anything the fast
+    path cannot read cleanly, such as malformed XML, HTML entities or unusual
+    date formats, falls back to feedparser.
+    """
+    feed_format = sniff_feed_format(content)
+    try:
+        if feed_format == 'json':
+            return parse_json_feed(content)
+        if feed_format in ('rss', 'atom'):
+            return parse_xml_feed(content, feed_format)
+    except (ValueError, TypeError, AttributeError, ET.ParseError):
+        pass
+
+    # Descriptions are reduced to plain text by clean_description, so
+    # feedparser's HTML sanitiser and URI rewriting are wasted work
+    return feedparser.parse(
+        trim_feed_items(content),
+        sanitize_html=False,
+        resolve_relative_uris=False,
+    ).entries
+
+# Download and parse one feed; runs on the fetch thread pool
+def fetch_feed(url, etag=None, last_modified=None, content_hash=None):
+    """Conditionally download and parse a feed.
+
+    Returns None when the server answers 304 Not Modified, otherwise a tuple
+    of (entries, etag, last_modified, content_hash) with the response's new
+    validators and body hash. entries is None when the body hashes to
+    content_hash; the validators are still returned so a server that rotates
+    ETags over an unchanged body can answer 304 next time.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with SESSION.get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        content = read_feed_body(response, url)
+        logging.debug(f"{url} served with Content-Encoding: {response.headers.get('Content-Encoding', 'identity')}")
+
+    new_etag = response.headers.get('ETag')
+    new_last_modified = response.headers.get('Last-Modified')
+    new_hash = hashlib.blake2b(content, digest_size=8).hexdigest()
+    if new_hash == content_hash:
+        return None, new_etag, new_last_modified, new_hash
+
+    return parse_feed(content), new_etag, new_last_modified, new_hash
+
+def commit_feeds(session):
+    try:
+        session.commit()
+    except Exception as commit_error:
+        logging.error(f"Commit failed; the last batch of feeds will be fetched again next run: {commit_error}")
+        session.rollback()
 
 # Function to fetch and save RSS feeds
 def fetch_and_save_rss_feeds():
     ensure_schema()
+    if has_link_published_unique_index():
+        conflict_columns = ['link', 'published']
+    else:
+        conflict_columns = None
+        logging.warning(
+            "rss_feed_entries has no unique index on (link, published); "
+            "inserting without an ON CONFLICT target."
+        )
 
-    Session = sessionmaker(bind=engine)
+    # Sources stay loaded across the batched commits instead of being
+    # re-selected one by one after every commit
+    # Nothing here relies on autoflush: entries are bulk-inserted and the
+    # savepoints flush source updates before each commit
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
     session = Session()
 
     feed_sources = session.query(RSSFeedSource).all()
+    # Don't hold the read transaction open while feeds download
+    session.commit()
+    pending_feeds = 0
 
-    for source in feed_sources:
-        try:
-            response = requests.get(source.url, timeout=30)
-            response.raise_for_status()
-            feed = feedparser.parse(response.content)
-
-            add_new_entries(session, feed.entries, source.id, limit=20)
+    # Feeds are downloaded and parsed concurrently; database writes stay on this
+    # thread because the SQLAlchemy session is not thread-safe.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        futures = submit_per_host(executor, fetch_feed, [
+            (source.url, source.etag, source.last_modified, source.content_hash)
+            for source in feed_sources
+        ])
 
-            # COMMIT after each feed
+        for source, future in zip(feed_sources, futures):
             try:
-                session.commit()
-            except Exception as commit_error:
-                logging.error(f"Commit failed for {source.url}: {commit_error}")
-                session.rollback()
+                result = future.result()
+                if result is None:
+                    logging.info(f"{source.url} not modified since the last fetch; skipping.")
+                    continue
+                entries, etag, last_modified, content_hash = result
+
+                # A savepoint per feed: a failing feed is rolled back on its own
+                # without losing the rest of the batch
+                with session.begin_nested():
+                    if entries is None:
+                        added = 0
+                    else:
+                        added = add_new_entries(
+                            session, entries, source.id, limit=20, conflict_columns=conflict_columns
+                        )
+                    # Saved in the same commit as the entries, so a failed feed
+                    # is downloaded in full again on the next run
+                    source.etag = etag
+                    source.last_modified = last_modified
+                    source.content_hash = content_hash
+
+                pending_feeds += 1
+                if pending_feeds >= FEEDS_PER_COMMIT:
+                    commit_feeds(session)
+                    pending_feeds = 0
 
-            logging.info(f"Processed {len(feed.entries)} entries from {source.url}.")
+                if entries is None:
+                    logging.info(f"{source.url} body unchanged since the last fetch; skipping.")
+                else:
+                    logging.info(f"Processed {len(entries)} entries from {source.url}, {added} new.")
         
-        except requests.exceptions.SSLError as ssl_error:
-            logging.error(f"SSL error fetching the RSS feed from {source.url}: {ssl_error}")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching the RSS feed from {source.url}: {e}")
-        except Exception as e:
-            logging.error(f"An error occurred while processing {source.url}: {e}")
+            except requests.exceptions.SSLError as ssl_error:
+                logging.error(f"SSL error fetching the RSS feed from {source.url}: {ssl_error}")
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Error fetching the RSS feed from {source.url}: {e}")
+            except Exception as e:
+                logging.error(f"An error occurred while processing {source.url}: {e}")
 
+    commit_feeds(session)
     session.close()
 
 if __name__ == '__main__':
@@ -1,9 +1,13 @@
 import importlib.util
 import os
+import threading
 import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from sqlalchemy import false
+
 
 ROOT = Path(__file__).resolve().parents[1]
 
@@ -46,6 +50,213 @@ class FetcherEntryPreparationTests(unittest.TestCase):
         self.assertIsNone(fetcher.prepare_feed_entry(missing_date))
         self.assertIsNone(fetcher.prepare_feed_entry(missing_link))
 
+    def test_detects_unique_link_published_index(self):
+        fetcher.Base.metadata.create_all(fetcher.engine)
+
+        self.assertTrue(fetcher.has_link_published_unique_index())
+
+    def test_counts_only_rows_actually_inserted(self):
+        fetcher.Base.metadata.create_all(fetcher.engine)
+        session = fetcher.sessionmaker(bind=fetcher.engine)()
+        self.addCleanup(session.close)
+        session.add(fetcher.RSSFeedSource(id=101, url="https://example.com/count-feed"))
+        session.add(fetcher.RSSFeedEntry(
+            title="Stored by another run",
+            link="https://example.com/count-taken",
+            published=fetcher.datetime(2026, 7, 2, 9, 30),
+            feed_id=101,
+        ))
+        session.commit()
+
+        class ConcurrentRunSession:
+            """Session whose link lookup misses the row another run just stored."""
+
+            def query(self, *columns):
+                query = session.query(*columns)
+                return query.filter(false()) if len(columns) == 2 else query
+
+            def execute(self, statement):
+                return session.execute(statement)
+
+        published = time.struct_time((2026, 7, 2, 9, 30, 0, 3, 183, 0))
+        entries = [
+            {"title": "Taken", "link": "https://example.com/count-taken", "published_parsed": published},
+            {"title": "Fresh", "link": "https://example.com/count-fresh", "published_parsed": published},
+        ]
+
+        added = fetcher.add_new_entries(
+            ConcurrentRunSession(), entries, 101, conflict_columns=["link", "published"]
+        )
+
+        self.assertEqual(added, 1)
+
+    def test_future_dated_entry_does_not_block_new_entries(self):
+        fetcher.Base.metadata.create_all(fetcher.engine)
+        session = fetcher.sessionmaker(bind=fetcher.engine)()
+        self.addCleanup(session.close)
+        now = fetcher.datetime.now(fetcher.timezone.utc).replace(tzinfo=None)
+        session.add(fetcher.RSSFeedSource(id=102, url="https://example.com/future-feed"))
+        session.add(fetcher.RSSFeedEntry(
+            title="Scheduled",
+            link="https://example.com/future-scheduled",
+            published=now + fetcher.timedelta(days=30),
+            feed_id=102,
+        ))
+        session.commit()
+
+        entries = [{
+            "title": "Today",
+            "link": "https://example.com/future-today",
+            "published_parsed": now.timetuple(),
+        }]
+
+        added = fetcher.add_new_entries(session, entries, 102, conflict_columns=["link", "published"])
+
+        self.assertEqual(added, 1)
+
+    def test_cleans_markup_and_entities_from_descriptions(self):
+        self.assertEqual(
+            fetcher.clean_description("<p>Rates <b>rise</b> &amp; fall</p><script>track()</script>"),
+            "Rates rise & fall",
+        )
+        self.assertEqual(fetcher.clean_description("Plain text"), "Plain text")
+        self.assertEqual(fetcher.clean_description(None), "")
+
+    def test_trims_long_feeds_before_parsing(self):
+        items = b"".join(
+            b"<item><title>Item %d</title><link>https://example.com/%d</link></item>" % (i, i)
+            for i in range(5)
+        )
+        content = b'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>' + items + b"</channel></rss>"
+
+        trimmed = fetcher.feedparser.parse(fetcher.trim_feed_items(content, max_items=2))
+
+        self.assertEqual([entry.title for entry in trimmed.entries], ["Item 0", "Item 1"])
+        self.assertEqual(fetcher.trim_feed_items(content, max_items=5), content)
+        self.assertEqual(fetcher.trim_feed_items(b"<rss><channel>&nbsp;", max_items=2), b"<rss><channel>&nbsp;")
+
+    def test_fast_path_matches_feedparser_for_plain_rss(self):
+        content = (
+            b'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>'
+            b"<item><title>Story</title><link>https://example.com/story</link>"
+            b"<pubDate>Thu, 02 Jul 2026 11:30:00 +0200</pubDate>"
+            b"<description><![CDATA[<p>Body</p>]]></description></item>"
+            b"</channel></rss>"
+        )
+
+        self.assertEqual(fetcher.sniff_feed_format(content), "rss")
+        fast = fetcher.prepare_feed_entry(fetcher.parse_feed(content)[0])
+        slow = fetcher.prepare_feed_entry(fetcher.feedparser.parse(content).entries[0])
+
+        self.assertEqual(fast[1:], slow[1:])
+        self.assertEqual(fast[1].isoformat(), "2026-07-02T09:30:00")
+
+    def test_fast_path_uses_permalink_guid_and_skips_linkless_items(self):
+        content = (
+            b'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>'
+            b"<item><title>Guid only</title><guid>https://example.com/g</guid>"
+            b"<pubDate>Thu, 02 Jul 2026 11:30:00 +0200</pubDate></item>"
+            b'<item><title>Opaque guid</title><guid isPermaLink="false">tag:1</guid>'
+            b"<pubDate>Thu, 02 Jul 2026 11:30:00 +0200</pubDate></item>"
+            b"</channel></rss>"
+        )
+
+        fast = fetcher.parse_feed(content)
+        slow = fetcher.feedparser.parse(content).entries
+
+        self.assertEqual(fetcher.prepare_feed_entry(fast[0])[2], "https://example.com/g")
+        self.assertEqual(fetcher.prepare_feed_entry(fast[0])[1:], fetcher.prepare_feed_entry(slow[0])[1:])
+        self.assertNotIn("link", fast[1])
+        self.assertIsNone(fetcher.prepare_feed_entry(fast[1]))
+        self.assertIsNone(fetcher.prepare_feed_entry({"title": "No link", "link": None}))
+
+    def test_fast_path_ignores_empty_namespaced_siblings(self):
+        rss = (
+            b'<?xml version="1.0"?><rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">'
+            b"<channel><title>Feed</title><item><title>Story</title>"
+            b'<atom:link rel="self" href="https://example.com/self"/>'
+            b"<link>https://example.com/story</link>"
+            b"<pubDate>Thu, 02 Jul 2026 11:30:00 +0200</pubDate></item></channel></rss>"
+        )
+        atom = (
+            b'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom" '
+            b'xmlns:media="http://search.yahoo.com/mrss/"><title>Feed</title>'
+            b'<entry><title>Entry</title><link href="https://example.com/entry"/>'
+            b"<updated>2026-07-02T09:30:00Z</updated>"
+            b'<media:content url="https://example.com/image.jpg"/>'
+            b"<content>Body</content></entry></feed>"
+        )
+
+        rss_entry = fetcher.parse_feed(rss)[0]
+        atom_entry = fetcher.parse_feed(atom)[0]
+
+        self.assertEqual(rss_entry["link"], "https://example.com/story")
+        self.assertEqual(atom_entry["link"], "https://example.com/entry")
+        self.assertEqual(atom_entry["description"], "Body")
+
+    def test_fast_path_ignores_extension_elements_with_core_names(self):
+        rss = (
+            b'<?xml version="1.0"?><rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/" '
+            b'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"><channel><title>Feed</title>'
+            b"<item><media:title>Media title</media:title><title>Story</title>"
+            b"<itunes:summary>Podcast summary</itunes:summary><description>Body</description>"
+            b"<link>https://example.com/story</link>"
+            b"<pubDate>Thu, 02 Jul 2026 11:30:00 +0200</pubDate></item></channel></rss>"
+        )
+        atom = (
+            b'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom" '
+            b'xmlns:media="http://search.yahoo.com/mrss/"><title>Feed</title>'
+            b"<entry><media:title>Media title</media:title><title>Entry</title>"
+            b'<link href="https://example.com/entry"/><updated>2026-07-02T09:30:00Z</updated>'
+            b"<media:description>Media description</media:description><summary>Summary</summary></entry></feed>"
+        )
+
+        rss_entry = fetcher.parse_feed(rss)[0]
+        atom_entry = fetcher.parse_feed(atom)[0]
+
+        self.assertEqual((rss_entry["title"], rss_entry["description"]), ("Story", "Body"))
+        self.assertEqual((atom_entry["title"], atom_entry["description"]), ("Entry", "Summary"))
+
+    def test_reads_json_feed_items(self):
+        content = (
+            b'{"version": "https://jsonfeed.org/version/1.1", "items": [{"id": "1", '
+            b'"url": "https://example.com/json", "title": "Json", '
+            b'"date_published": "2026-07-02T09:30:00Z", "content_text": "Body"}]}'
+        )
+
+        self.assertEqual(fetcher.sniff_feed_format(content), "json")
+        prepared = fetcher.prepare_feed_entry(fetcher.parse_feed(content)[0])
+
+        self.assertEqual(prepared[2], "https://example.com/json")
+        self.assertEqual(prepared[1].isoformat(), "2026-07-02T09:30:00")
+
+
+class FetchSchedulingTests(unittest.TestCase):
+    def test_busy_host_does_not_hold_threads_other_hosts_need(self):
+        release = threading.Event()
+        other_host_done = threading.Event()
+
+        def fake_fetch(url):
+            if "busy.example.com" in url:
+                release.wait(5)
+            else:
+                other_host_done.set()
+            return url
+
+        calls = [(f"https://busy.example.com/feed{i}",) for i in range(8)]
+        calls.append(("https://other.example.com/feed",))
+
+        # One thread more than the per-host limit: the busy host's queued feeds
+        # must not take it
+        with ThreadPoolExecutor(max_workers=fetcher.MAX_REQUESTS_PER_HOST + 1) as executor:
+            futures = fetcher.submit_per_host(executor, fake_fetch, calls)
+            started_without_waiting = other_host_done.wait(2)
+            release.set()
+            results = [future.result(5) for future in futures]
+
+        self.assertTrue(started_without_waiting)
+        self.assertEqual(results, [call[0] for call in calls])
+
 
 class AnalyserValidationTests(unittest.TestCase):
     def test_normalizes_valid_ai_response(self):
@@ -61,6 +272,17 @@ class AnalyserValidationTests(unittest.TestCase):
         self.assertEqual(result.category, "Politics")
         self.assertEqual(result.keywords, ["economy", "2026"])
 
+    def test_validates_whole_batch_with_normalization(self):
+        results = analyser.ARTICLE_LIST_ADAPTER.validate_python([
+            {"keywords": "economy, trade", "sentiment": "NEGATIVE", "category": "world"},
+            {"translated_title": "Title", "sentiment": "neutral", "category": "Sports"},
+        ])
+
+        self.assertEqual(results[0].keywords, ["economy", "trade"])
+        self.assertEqual(results[0].sentiment, "negative")
+        self.assertEqual(results[0].category, "World")
+        self.assertEqual(results[1].keywords, [])
+
     def test_rejects_invalid_sentiment(self):
         with self.assertRaises(ValueError):
             analyser.normalize_article_response({
@@ -92,12 +314,84 @@ class AnalyserValidationTests(unittest.TestCase):
             })
 
 
-class MarkProcessedTests(unittest.TestCase):
-    def test_marks_only_successful_ids(self):
-        original_execute_batch = analyser.execute_batch
+class ResponseParsingTests(unittest.TestCase):
+    def test_parses_complete_array(self):
+        items = analyser.parse_response_items('[{"sentiment": "neutral"}, {"sentiment": "positive"}]')
+
+        self.assertEqual([item["sentiment"] for item in items], ["neutral", "positive"])
+
+    def test_recovers_complete_items_from_truncated_array(self):
+        items = analyser.parse_response_items(
+            '[{"sentiment": "neutral"},\n {"sentiment": "positive"}, {"sentiment": "nega'
+        )
+
+        self.assertEqual([item["sentiment"] for item in items], ["neutral", "positive"])
+
+    def test_rejects_non_array_and_unrecoverable_output(self):
+        with self.assertRaises(ValueError):
+            analyser.parse_response_items('{"sentiment": "neutral"}')
+        with self.assertRaises(ValueError):
+            analyser.parse_response_items('[{"sentiment": "neu')
+
+
+class AnalysisCacheTests(unittest.TestCase):
+    def test_cache_key_depends_on_title_and_description(self):
+        key = analyser.analysis_cache_key("Title", "Description")
+
+        self.assertEqual(key, analyser.analysis_cache_key("Title", "Description"))
+        self.assertNotEqual(key, analyser.analysis_cache_key("TitleD", "escription"))
+        self.assertEqual(analyser.analysis_cache_key(None, None), analyser.analysis_cache_key("", ""))
+
+    def test_cached_result_round_trips_to_analysis_row(self):
+        row = (7, "Title", "Description", ["economy", "trade"], "neutral", "Business")
+
+        result = analyser.analysis_row_to_result(row)
+
+        self.assertEqual(result["keywords"], ["economy", "trade"])
+        self.assertEqual(analyser.analysis_result_to_row(7, result), row)
+
+
+class RequestThrottleTests(unittest.TestCase):
+    def test_spaces_request_starts_by_interval(self):
+        throttle = analyser.RequestThrottle(0.05)
+
+        started = time.monotonic()
+        for _ in range(3):
+            throttle.wait()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    def test_back_off_delays_the_next_request(self):
+        throttle = analyser.RequestThrottle(0)
+
+        started = time.monotonic()
+        throttle.back_off(0.05)
+        throttle.wait()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_rate_limit_delay_honours_retry_after(self):
+        class FakeResponse:
+            headers = {"retry-after": "7"}
+
+        class RateLimited(Exception):
+            status_code = 429
+            response = FakeResponse()
+
+        class ServerError(Exception):
+            status_code = 500
+
+        self.assertEqual(analyser.rate_limit_delay(RateLimited()), 7.0)
+        self.assertIsNone(analyser.rate_limit_delay(ServerError()))
+        self.assertIsNone(analyser.rate_limit_delay(ValueError("boom")))
+
+
+class StoreAnalysedEntriesTests(unittest.TestCase):
+    def _store(self, analysed_data):
+        original_execute_values = analyser.execute_values
         captured = {}
 
-        def fake_execute_batch(cursor, statement, params):
+        def fake_execute_values(cursor, statement, params, **kwargs):
             captured["statement"] = statement
             captured["params"] = params
 
@@ -122,13 +416,98 @@ class MarkProcessedTests(unittest.TestCase):
                 return self.cursor_instance
 
         try:
-            analyser.execute_batch = fake_execute_batch
-            analyser.mark_as_processed(FakeConnection(), [2, 5])
+            analyser.execute_values = fake_execute_values
+            analyser.store_analysed_entries(FakeConnection(), analysed_data)
         finally:
-            analyser.execute_batch = original_execute_batch
+            analyser.execute_values = original_execute_values
+
+        return captured
+
+    def test_marks_only_inserted_ids(self):
+        rows = [
+            (2, "Title", "Description", ["economy"], "neutral", "Business"),
+            (5, "Title", "Description", ["sport"], "positive", "Sports"),
+        ]
 
-        self.assertEqual(captured["params"], [(2,), (5,)])
+        captured = self._store(rows)
+
+        self.assertEqual([params[0] for params in captured["params"]], [2, 5])
+        self.assertEqual(captured["params"][1][3].adapted, ["sport"])
+        self.assertIn("RETURNING entry_id", captured["statement"])
         self.assertIn("processed = TRUE", captured["statement"])
+        self.assertIn("SELECT entry_id FROM inserted", captured["statement"])
+
+    def test_skips_empty_batches(self):
+        self.assertEqual(self._store([]), {})
+
+
+class StoreWithSavepointsTests(unittest.TestCase):
+    def test_failed_chunk_only_drops_its_own_rows(self):
+        rows = [(entry_id, "Title", "Description", [], "neutral", "World") for entry_id in range(1, 26)]
+        executed = []
+
+        class FakeCursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc, traceback):
+                return False
+
+            def execute(self, statement):
+                executed.append(statement)
+
+        class FakeConnection:
+            def cursor(self):
+                return FakeCursor()
+
+        def fake_store(conn, analysed_data):
+            if any(row[0] == 13 for row in analysed_data):
+                raise analyser.psycopg2.DataError("bad row")
+
+        original_store = analyser.store_analysed_entries
+        original_cache = analyser.cache_analyses
+        try:
+            analyser.store_analysed_entries = fake_store
+            analyser.cache_analyses = lambda conn, entries, analysed_data: None
+            stored = analyser.store_with_savepoints(FakeConnection(), [], rows)
+        finally:
+            analyser.store_analysed_entries = original_store
+            analyser.cache_analyses = original_cache
+
+        self.assertEqual([row[0] for row in stored], list(range(1, 11)) + list(range(21, 26)))
+        self.assertIn("ROLLBACK TO SAVEPOINT store_batch;", executed)
+        self.assertEqual(executed.count("ROLLBACK TO SAVEPOINT store_chunk;"), 1)
+
+    def test_only_provider_rows_are_written_to_the_cache(self):
+        rows = [(entry_id, "Title", "Description", [], "neutral", "World") for entry_id in (1, 2, 3)]
+        cached = []
+
+        class FakeCursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc, traceback):
+                return False
+
+            def execute(self, statement):
+                pass
+
+        class FakeConnection:
+            def cursor(self):
+                return FakeCursor()
+
+        original_store = analyser.store_analysed_entries
+        original_cache = analyser.cache_analyses
+        try:
+            analyser.store_analysed_entries = lambda conn, analysed_data: None
+            analyser.cache_analyses = lambda conn, entries, analysed_data: cached.extend(analysed_data)
+            stored = analyser.store_with_savepoints(FakeConnection(), [], rows, cached_entry_ids={1, 3})
+        finally:
+            analyser.store_analysed_entries = original_store
+            analyser.cache_analyses = original_cache
+
+        self.assertEqual(stored, rows)
+        self.assertEqual([row[0] for row in cached], [2])
 
 
 if __name__ == "__main__":